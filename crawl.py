@@ -1,12 +1,19 @@
 import hashlib
 import os
+import posixpath
 import re
+from functools import lru_cache
 import aiohttp
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 from urllib.parse import urljoin, urlparse
+from urllib.robotparser import RobotFileParser
 import argparse
 import logging
+from dataclasses import dataclass
+import xxhash
 
 # Set up logging
 logging.basicConfig(format='%(process)d:%(levelname)s:%(module)s:%(message)s', level=logging.INFO)
@@ -17,91 +24,392 @@ parser.add_argument("url", help="The URL of the website to crawl")
 parser.add_argument("--domains", nargs="+", help="List of allowed domains")
 parser.add_argument("--purge", action="store_true", help="Purge each URL cache before visiting", default=False)
 parser.add_argument("--clean-cache", action="store_true", help="Clean the cache after crawling", default=False)
+parser.add_argument("--skip-binary", action="store_true", help="Probe each URL with HEAD and skip downloading non-textual content", default=False)
+parser.add_argument("--concurrency", type=int, help="Maximum number of concurrent requests", default=20)
+parser.add_argument("--rate-limit", type=float, help="Maximum requests per second to each host, 0 for no limit", default=0)
+parser.add_argument("--respect-robots", action="store_true", help="Skip URLs disallowed by robots.txt and honor its Crawl-delay", default=False)
 
+# 64-bit digests of visited URLs, see url_digest()
 visited_urls = set()
 allowed_domains = set()
-semaphore = asyncio.Semaphore(20)
+
+# Tags that reference other resources, mapped to the attribute holding the URL
+link_attributes = {'a': 'href', 'link': 'href', 'script': 'src', 'img': 'src', 'video': 'src', 'audio': 'src'}
+link_selector = ', '.join(f"{tag}[{attribute}]" for tag, attribute in link_attributes.items())
+# Pages smaller than this are parsed inline, where IPC would cost more than the parse
+process_pool_min_size = 16_000
+# Content types whose bodies are decoded and scanned for links
+text_content_types = frozenset({'text/html', 'text/css', 'application/javascript'})
+# Resources scanned with the URL regex instead of the HTML parser
+text_suffixes = frozenset({'js', 'css'})
+# Suffixes of pages and text resources, which --skip-binary fetches without a HEAD probe first
+unprobed_suffixes = text_suffixes | frozenset({'', 'html', 'htm', 'php', 'asp', 'aspx', 'jsp'})
+# Absolute URLs referenced from JS/CSS bodies, plain re benchmarked faster than Hyperscan and RE2 here
+url_regex = re.compile(r'https?://[^\s<>"]+|www\.[^\s<>"]+')
+
+class AdmissionController:
+    # Counting semaphore whose limit can be raised or lowered while requests are in flight
+    def __init__(self, limit, backoff_interval=5.0, successes_per_step=10):
+        self.limit = limit
+        self.max_limit = limit
+        self.active = 0
+        self.condition = asyncio.Condition()
+        self.backoff_interval = backoff_interval
+        self.successes_per_step = successes_per_step
+        self.successes = 0
+        self.last_backoff = None
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self):
+        async with self.condition:
+            self.active -= 1
+            self.condition.notify(1)
+
+    async def set_limit(self, limit):
+        async with self.condition:
+            limit = max(1, limit)
+            raised = limit > self.limit
+            self.limit = limit
+            if raised:
+                self.condition.notify_all()
+
+    async def back_off(self):
+        # Halve the limit at most once per backoff_interval, so a burst of 429s counts as one
+        now = asyncio.get_running_loop().time()
+        if self.last_backoff is not None and now - self.last_backoff < self.backoff_interval:
+            return
+        self.last_backoff = now
+        self.successes = 0
+        await self.set_limit(self.limit // 2)
+        logging.warning(f"Rate limited, concurrency lowered to {self.limit}")
+
+    async def record_success(self):
+        # Ramp back up by one slot every successes_per_step responses once the backoff window has passed
+        if self.limit >= self.max_limit:
+            return
+        if self.last_backoff is not None and asyncio.get_running_loop().time() - self.last_backoff < self.backoff_interval:
+            return
+        self.successes += 1
+        if self.successes >= self.successes_per_step:
+            self.successes = 0
+            await self.set_limit(self.limit + 1)
+            logging.info(f"Concurrency raised to {self.limit}")
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+admission = AdmissionController(20)
+
+class RateLimited(Exception):
+    # Raised by fetch_page on a 429 so the worker can queue the URL again
+    pass
+
+# How often a rate limited URL is queued again before it's given up on
+max_retries = 3
+# Rate limited attempts per URL
+retry_counts = {}
+
+async def wait_for_retry(url):
+    # Count a rate limited attempt, returns True once it's worth queueing the URL again
+    attempts = retry_counts.get(url, 0) + 1
+    retry_counts[url] = attempts
+    if attempts > max_retries:
+        logging.error(f"Giving up on {url} after {max_retries} rate limited attempts")
+        return False
+    logging.warning(f"Rate limited on {url}, retry {attempts} of {max_retries}")
+    # Give the lowered concurrency time to take effect before trying again
+    await asyncio.sleep(admission.backoff_interval)
+    return True
+
+class HostLimiter:
+    # Spaces out every request to each host (GET, HEAD, PURGE and robots.txt),
+    # robots.txt Crawl-delay can widen the gap per host
+    def __init__(self, interval=0):
+        self.interval = interval
+        self.host_intervals = {}
+        self.next_slots = {}
+
+    def set_host_interval(self, host, interval):
+        # The robots.txt request itself went out at the old interval, so space the next one from now
+        self.host_intervals[host] = interval
+        now = asyncio.get_running_loop().time()
+        self.next_slots[host] = max(self.next_slots.get(host, now), now + interval)
+
+    async def acquire(self, host):
+        interval = max(self.interval, self.host_intervals.get(host, 0))
+        if interval <= 0:
+            return
+        now = asyncio.get_running_loop().time()
+        # Reserve the next free slot before sleeping so concurrent callers line up behind it
+        slot = max(now, self.next_slots.get(host, now))
+        self.next_slots[host] = slot + interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+host_limiter = HostLimiter()
 
 # Nginx cache settings
 cache_dir = "/root/nginx/cache"
 temp_cache_dir = "/tmp/cache"
 cache_path_levels = "1:2"
 
-def generate_cache_key(url):
+def generate_cache_key(info):
     # Generate a cache key using this pattern: $scheme$request_method$host$request_uri
-    parsed_url = urlparse(url)
-    cache_key = f"{parsed_url.scheme}GET{parsed_url.hostname}{parsed_url.path}"
+    cache_key = f"{info.scheme}GET{info.host}{info.path}"
     return cache_key
 
+def cache_path_levels_1_2(cache_key_md5):
+    return f"{cache_dir}/{cache_key_md5[-1]}/{cache_key_md5[-3:-1]}/{cache_key_md5}"
+
+def cache_path_levels_1_2_3(cache_key_md5):
+    return f"{cache_dir}/{cache_key_md5[-1]}/{cache_key_md5[-3:-1]}/{cache_key_md5[-6:-3]}/{cache_key_md5}"
+
+def cache_path_flat(cache_key_md5):
+    return f"{cache_dir}/{cache_key_md5}"
+
+# Resolve the directory layout once instead of on every URL
+build_cache_path = {"1:2": cache_path_levels_1_2, "1:2:3": cache_path_levels_1_2_3}.get(cache_path_levels, cache_path_flat)
+
 def get_cache_file_path(cache_key):
     # Generate a cache path using nginx's cache directory and the md5 hash of the cache key
-    cache_key_md5 = hashlib.md5(cache_key.encode()).hexdigest()
+    # nginx names cache files by md5, so the digest can't be swapped for a faster one
+    return build_cache_path(hashlib.md5(cache_key.encode()).hexdigest())
 
-    if cache_path_levels == "1:2":
-        return os.path.join(cache_dir, cache_key_md5[-1], cache_key_md5[-3:-1], cache_key_md5)
-    elif cache_path_levels == "1:2:3":
-        return os.path.join(cache_dir, cache_key_md5[-1], cache_key_md5[-3:-1], cache_key_md5[-6:-3], cache_key_md5)
-    else:
-        return os.path.join(cache_dir, cache_key_md5)
+def force_http(url):
+    # Change schema to http
+    if url.startswith('https'):
+        return 'http' + url[5:]
+    return url
+
+def is_text_content(content_type):
+    # Compare the bare media type, the header may carry parameters or be missing entirely
+    media_type = (content_type or '').split(';', 1)[0].strip().lower()
+    return media_type in text_content_types or media_type.startswith('text/')
 
 async def fetch_page(session, url):
     try:
-        # Change schema to http
-        url = re.sub(r'^https', 'http', url)
+        url = force_http(url)
         logging.info(f"Fetching {url}")
-        async with semaphore:
+        await host_limiter.acquire(get_netloc(url))
+        async with admission:
             async with session.get(url) as response:
                 response.raise_for_status()
-                _ = await response.read()
-                return (response.headers.get('Content-Type'), response)
+                content_type = response.headers.get('Content-Type')
+                if is_text_content(content_type):
+                    text = await response.text(errors='replace')
+                else:
+                    # Drain binary bodies chunk by chunk so they're never held in memory
+                    async for _ in response.content.iter_chunked(65536):
+                        pass
+                    text = None
+                status = response.status
+        await admission.record_success()
+        return (status, content_type, text)
     except aiohttp.ClientError as e:
+        if getattr(e, 'status', None) == 429:
+            # Back off instead of hammering a rate-limited upstream
+            await admission.back_off()
+            raise RateLimited(url) from e
         logging.error(f"Failed to fetch {url}: {e}")
-        return (None, None)
+        return (None, None, None)
     except asyncio.TimeoutError as e:
         logging.error(f"Timeout error for {url}: {e}")
-        return (None, None)
-    
+        return (None, None, None)
+
+async def head_content_type(session, url):
+    try:
+        url = force_http(url)
+        logging.debug(f"Probing {url}")
+        await host_limiter.acquire(get_netloc(url))
+        async with admission:
+            async with session.head(url, allow_redirects=True) as response:
+                response.raise_for_status()
+                return response.headers.get('Content-Type')
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Not every server answers HEAD, let the GET decide
+        logging.debug(f"Failed to probe {url}: {e}")
+        return None
+
 async def purge_page(session, url):
     try:
-        # Change schema to http
-        url = re.sub(r'^https', 'http', url)
+        url = force_http(url)
         logging.info(f"Purging {url}")
-        async with semaphore:
+        await host_limiter.acquire(get_netloc(url))
+        async with admission:
             async with session.request('PURGE', url) as response:
                 response.raise_for_status()
                 return await response.text()
     except aiohttp.ClientError as e:
         # Check if the URL is already purged and response code is 404
-        if e.status == 404:
+        if getattr(e, 'status', None) == 404:
             logging.info(f"URL {url} is already purged")
             return None
         logging.error(f"Failed to purge {url}: {e}")
         return None
 
-async def renew_page_cache(session, url):
+class PurgeBatch:
+    # Collects URLs to purge and issues their PURGE requests together in the background
+    def __init__(self, session, max_size=256, interval=1.0):
+        self.session = session
+        self.max_size = max_size
+        self.interval = interval
+        self.urls = []
+        self.full = asyncio.Event()
+        self.closed = False
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    def add(self, url):
+        self.urls.append(url)
+        if len(self.urls) >= self.max_size:
+            self.full.set()
+
+    async def run(self):
+        # Flush every interval seconds, or sooner once max_size URLs are buffered
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self.full.clear()
+            await self.flush()
+        await self.flush()
+
+    async def flush(self):
+        urls, self.urls = self.urls, []
+        if not urls:
+            return
+        logging.info(f"Purging {len(urls)} URLs")
+        responses = await asyncio.gather(*(purge_page(self.session, url) for url in urls), return_exceptions=True)
+        for url, response in zip(urls, responses):
+            if isinstance(response, Exception):
+                logging.error(f"Failed to purge {url}: {response}")
+            else:
+                logger.debug(f"Purge response for {url}: {response}")
+
+    async def close(self):
+        self.closed = True
+        self.full.set()
+        if self.task:
+            await self.task
+        else:
+            await self.flush()
+
+def parse_crawl_delay(lines):
+    # RobotFileParser.crawl_delay() only accepts whole seconds, so read the * group's value ourselves
+    agents = []
+    in_rules = False
+    for line in lines:
+        # A blank line ends the group, as in RobotFileParser.parse()
+        if not line:
+            agents = []
+            in_rules = False
+            continue
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        key, value = (part.strip() for part in line.split(':', 1))
+        key = key.lower()
+        if key == 'user-agent':
+            # A user-agent line after rules starts a new group
+            if in_rules:
+                agents = []
+                in_rules = False
+            agents.append(value)
+            continue
+        in_rules = True
+        if key == 'crawl-delay' and '*' in agents:
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            if delay > 0:
+                return delay
+    return None
+
+class RobotsCache:
+    # Loads robots.txt lazily, once per host, and shares it between workers
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.hosts = {}
+
+    async def load(self, session, scheme, host):
+        robots_url = force_http(f"{scheme}://{host}/robots.txt")
+        robots = RobotFileParser(robots_url)
+        crawl_delay = None
+        try:
+            await self.limiter.acquire(host)
+            async with session.get(robots_url) as response:
+                # 4xx is handled like RobotFileParser.read(), a 5xx means disallow everything (RFC 9309)
+                if response.status in (401, 403) or response.status >= 500:
+                    robots.disallow_all = True
+                elif response.status >= 400:
+                    robots.allow_all = True
+                else:
+                    lines = (await response.text(errors='replace')).splitlines()
+                    robots.parse(lines)
+                    crawl_delay = parse_crawl_delay(lines)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # An unreachable robots.txt means disallow everything (RFC 9309)
+            logging.warning(f"Failed to fetch {robots_url}, disallowing everything: {e}")
+            robots.disallow_all = True
+        if crawl_delay:
+            logging.info(f"Crawl-delay for {host}: {crawl_delay}")
+            self.limiter.set_host_interval(host, crawl_delay)
+        return robots
+
+    async def allowed(self, session, info):
+        if info.netloc not in self.hosts:
+            self.hosts[info.netloc] = asyncio.ensure_future(self.load(session, info.scheme, info.netloc))
+        robots = await self.hosts[info.netloc]
+        return robots.can_fetch('*', info.url)
+
+robots_cache = RobotsCache(host_limiter)
+
+def stash_cache_file(cache_file_path, temp_cache_file_path):
+    # Move the cache file to the temp directory, returns False if there is nothing cached
+    if not os.path.exists(cache_file_path):
+        return False
+    os.makedirs(os.path.dirname(temp_cache_file_path), exist_ok=True)
+    os.rename(cache_file_path, temp_cache_file_path)
+    return True
+
+async def renew_page_cache(session, info):
+    url = info.url
     # Get the cache key from the URL
-    cache_key = generate_cache_key(url)
+    cache_key = generate_cache_key(info)
 
     logging.info(f"Checking availibility of {url}")
     cache_file_path = get_cache_file_path(cache_key)
     logging.debug(f"Cache file path: {cache_file_path}")
     try:
-        if os.path.exists(cache_file_path):
+        temp_cache_file_path = os.path.join(temp_cache_dir, cache_file_path)
+        # Filesystem calls block, so keep them off the event loop
+        if await asyncio.to_thread(stash_cache_file, cache_file_path, temp_cache_file_path):
             logging.debug(f"Cache file found for {cache_file_path}")
-            # Move the cache file to the temp directory
-            temp_cache_file_path = os.path.join(temp_cache_dir, cache_file_path)
-            os.makedirs(os.path.dirname(temp_cache_file_path), exist_ok=True)
-            os.rename(cache_file_path, temp_cache_file_path)
             # Try to fetch the URL
-            content_type, response = await fetch_page(session, url)
-            if not response:
+            try:
+                status, _, _ = await fetch_page(session, url)
+            except RateLimited:
+                status = None
+            if not status:
                 logging.error(f"Failed to fetch {url}")
                 # Move the cache file back to the cache directory
-                os.rename(temp_cache_file_path, cache_file_path)
+                await asyncio.to_thread(os.rename, temp_cache_file_path, cache_file_path)
                 logging.warning(f"Cache file restored for {cache_key}")
                 return False
             # Remove the cache file from the temp directory
-            os.remove(temp_cache_file_path)
+            await asyncio.to_thread(os.remove, temp_cache_file_path)
             logging.info(f"Succesfully renewed cache for {url}")
             return True
         return False
@@ -110,54 +418,72 @@ async def renew_page_cache(session, url):
         return False
 
 
-def extract_links_from_html(html, base_url):
+def url_digest(url):
+    # Store a fixed-size 64-bit hash instead of the full URL string
+    return xxhash.xxh3_64_intdigest(url.encode())
+
+@dataclass(slots=True)
+class URLInfo:
+    # A queued URL, parsed once and carried through fetch, cache and extraction
+    url: str
+    scheme: str
+    host: str
+    netloc: str
+    path: str
+    suffix: str
+    uid: int
+
+    @classmethod
+    def from_url(cls, url, uid=None):
+        parsed_url = urlparse(url)
+        suffix = posixpath.splitext(parsed_url.path)[1][1:].lower()
+        uid = url_digest(url) if uid is None else uid
+        return cls(url, parsed_url.scheme, parsed_url.hostname, parsed_url.netloc, parsed_url.path, suffix, uid)
+
+def is_visited(url, uid=None):
+    return (url_digest(url) if uid is None else uid) in visited_urls
+
+def mark_visited(url, uid=None):
+    visited_urls.add(url_digest(url) if uid is None else uid)
+
+@lru_cache(maxsize=1 << 16)
+def get_netloc(url):
+    # Most links on a site share a handful of hosts, so memoize the parse
+    return urlparse(url).netloc
+
+def extract_hrefs_with_soup(html, base_url):
     try:
-        soup = BeautifulSoup(html, 'html.parser')
+        soup = BeautifulSoup(html, 'lxml')
     except Exception as e:
-        logging.error(f"Failed to parse {base_url}: {e}")
-        return set()
+        logging.warning(f"lxml failed to parse {base_url}, falling back to html.parser: {e}")
+        try:
+            soup = BeautifulSoup(html, 'html.parser')
+        except Exception as e:
+            logging.error(f"Failed to parse {base_url}: {e}")
+            return []
+
+    # Walk the tree once and pick the linking attribute based on the tag name
+    return [tag.get(link_attributes[tag.name]) for tag in soup.find_all(list(link_attributes))]
+
+def extract_links_from_html(html, base_url, domains):
+    try:
+        # Collect every linking attribute in a single CSS pass over the Lexbor tree
+        tree = LexborHTMLParser(html)
+        hrefs = {node.attributes.get(link_attributes[node.tag]) for node in tree.css(link_selector)}
+    except Exception as e:
+        logging.warning(f"Lexbor failed to parse {base_url}, falling back to BeautifulSoup: {e}")
+        hrefs = set(extract_hrefs_with_soup(html, base_url))
     links = set()
-    
-    # Extract links from <a> tags
-    for a_tag in soup.find_all('a', href=True):
-        href = a_tag['href']
-        full_url = urljoin(base_url, href)
-        if urlparse(full_url).netloc in allowed_domains:
-            links.add(full_url)
-    
-    # Extract links from <link> tags (CSS files)
-    for link_tag in soup.find_all('link', href=True):
-        href = link_tag['href']
+
+    # Pages repeat the same references (nav, footer), so resolve each unique one once
+    for href in hrefs:
+        if not href:
+            continue
         full_url = urljoin(base_url, href)
-        if urlparse(full_url).netloc in allowed_domains:
-            links.add(full_url)
-    
-    # Extract links from <script> tags (JS files)
-    for script_tag in soup.find_all('script', src=True):
-        src = script_tag['src']
-        full_url = urljoin(base_url, src)
-        if urlparse(full_url).netloc in allowed_domains:
-            links.add(full_url)
-    
-    # Extract links from <img> tags (images)
-    for img_tag in soup.find_all('img', src=True):
-        src = img_tag['src']
-        full_url = urljoin(base_url, src)
-        if urlparse(full_url).netloc in allowed_domains:
-            links.add(full_url)
-    
-    # Extract links from <video> tags (video files)
-    for video_tag in soup.find_all('video', src=True):
-        src = video_tag['src']
-        full_url = urljoin(base_url, src)
-        if urlparse(full_url).netloc in allowed_domains:
-            links.add(full_url)
-    
-    # Extract links from <audio> tags (audio files)
-    for audio_tag in soup.find_all('audio', src=True):
-        src = audio_tag['src']
-        full_url = urljoin(base_url, src)
-        if urlparse(full_url).netloc in allowed_domains:
+        # Only a snapshot inside a pool process, crawl_worker re-checks before queueing
+        if is_visited(full_url):
+            continue
+        if get_netloc(full_url) in domains:
             links.add(full_url)
 
     logging.info(f"Found {len(links)} links on {base_url}")
@@ -165,51 +491,114 @@ def extract_links_from_html(html, base_url):
 
 def extract_links_from_text(text, base_url):
     links = set()
-    regex = r'https?://[^\s<>"]+|www\.[^\s<>"]+'
-    matches = re.findall(regex, text)
+    base_netloc = urlparse(base_url).netloc
+    matches = url_regex.findall(text)
     for match in matches:
         full_url = urljoin(base_url, match)
-        if urlparse(full_url).netloc == urlparse(base_url).netloc:
+        if get_netloc(full_url) == base_netloc:
             links.add(full_url)
     logging.info(f"Found {len(links)} links on {base_url}")
     return links
 
-async def crawl(session, start_url):
-    queue = {start_url}
-    while queue:
-        logging.info(f"{start_url} - Queue: {len(queue)}, Visited: {len(visited_urls)}")
-        url = queue.pop()
-        if url in visited_urls:
-            logging.info(f"Already visited {url}")
-            continue
-        if args.purge:
-            renew_cache = await renew_page_cache(session, url)
-        content_type, response = await fetch_page(session, url)
-        if args.clean_cache:
-            purge_response = await purge_page(session, url)
-            logger.debug(f"Purge response: {purge_response}")
-        if response and response.ok:
-            logging.info(f"Successfully fetched {url}: {response.status}, {content_type}")
-            visited_urls.add(url)
-        else:
-            continue
-        if content_type in ['text/html', 'text/css', 'application/javascript'] or content_type.startswith('text/'):
-            text = await response.text()
-            if url.endswith('.js') or url.endswith('.css'):
-                links = extract_links_from_text(text, url)
+async def crawl_page(session, info, purge_batch=None, executor=None):
+    # Fetch a single URL and return the links discovered on it
+    url = info.url
+    if is_visited(url, info.uid):
+        logging.info(f"Already visited {url}")
+        return set()
+    if args.respect_robots and not await robots_cache.allowed(session, info):
+        logging.info(f"Disallowed by robots.txt: {url}")
+        mark_visited(url, info.uid)
+        return set()
+    if args.skip_binary and info.suffix not in unprobed_suffixes:
+        content_type = await head_content_type(session, url)
+        if content_type and not is_text_content(content_type):
+            logging.info(f"Skipping {url}: {content_type}")
+            mark_visited(url, info.uid)
+            return set()
+    if args.purge:
+        renew_cache = await renew_page_cache(session, info)
+    status, content_type, text = await fetch_page(session, url)
+    if purge_batch:
+        purge_batch.add(url)
+    if status:
+        logging.info(f"Successfully fetched {url}: {status}, {content_type}")
+        mark_visited(url, info.uid)
+    else:
+        return set()
+    if text is not None:
+        if info.suffix in text_suffixes:
+            return extract_links_from_text(text, url)
+        if executor and len(text) > process_pool_min_size:
+            # Parse large pages in another process so the event loop keeps serving fetches
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, extract_links_from_html, text, url, allowed_domains)
+        return extract_links_from_html(text, url, allowed_domains)
+    return set()
+
+async def crawl_worker(session, queue, pending, purge_batch=None, executor=None):
+    while True:
+        info = await queue.get()
+        retry = False
+        try:
+            logging.info(f"Queue: {queue.qsize()}, Visited: {len(visited_urls)}")
+            links = await crawl_page(session, info, purge_batch, executor)
+            for link in links:
+                if link in pending:
+                    continue
+                # Hash once and only parse the links that actually get queued
+                uid = url_digest(link)
+                if is_visited(link, uid):
+                    continue
+                pending.add(link)
+                queue.put_nowait(URLInfo.from_url(link, uid))
+        except RateLimited:
+            retry = await wait_for_retry(info.url)
+        except Exception as e:
+            logging.error(f"Failed to crawl {info.url}: {e}")
+        finally:
+            # URLs stay pending while queued or in flight so no two workers take the same one
+            if retry:
+                queue.put_nowait(info)
             else:
-                links = extract_links_from_html(text, url)
-            queue.update(links)
+                pending.discard(info.url)
+            queue.task_done()
+
+async def crawl(session, start_url, purge_batch=None, executor=None):
+    queue = asyncio.Queue()
+    pending = {start_url}
+    queue.put_nowait(URLInfo.from_url(start_url))
+    workers = [asyncio.create_task(crawl_worker(session, queue, pending, purge_batch, executor)) for _ in range(args.concurrency)]
+    # The queue drains only once every in-flight page has enqueued its links
+    await queue.join()
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
 
 async def main(start_url):
-    async with aiohttp.ClientSession() as session:
-        await crawl(session, start_url)
+    # Reuse keep-alive connections across the crawl and cache DNS lookups
+    connector = aiohttp.TCPConnector(limit=200, limit_per_host=args.concurrency, ttl_dns_cache=300, keepalive_timeout=60)
+    # Catch hung connections and stalled reads, but let large assets take as long as they need
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        purge_batch = PurgeBatch(session) if args.clean_cache else None
+        if purge_batch:
+            purge_batch.start()
+        try:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                await crawl(session, start_url, purge_batch, executor)
+        finally:
+            if purge_batch:
+                await purge_batch.close()
 
 if __name__ == "__main__":
     args = parser.parse_args()
     start_url = args.url
     if args.domains:
         allowed_domains.update(args.domains)
+    admission.limit = admission.max_limit = args.concurrency
+    if args.rate_limit > 0:
+        host_limiter.interval = 1 / args.rate_limit
     logging.info(f"Start crawling at {start_url}")
     logging.info(f"Allowed domains: {allowed_domains}")
     asyncio.run(main(start_url))